@@ -3,6 +3,7 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 from openai import OpenAI
+from src.api.model_router import model_router
 
 # Inicializa o Flask App
 app = Flask(__name__)
@@ -38,18 +39,18 @@ def generate_summary_handler():
         {health_data}
         """
 
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        # Modelo e max_tokens escolhidos pelo roteador, com fallback em caso de falha
+        summary, routing = model_router.complete(
+            client,
+            "summary_full",
             messages=[
                 {"role": "system", "content": "Você é um coach de bem-estar e saúde, especialista em interpretar dados e motivar pessoas."},
                 {"role": "user", "content": prompt_text}
             ],
-            temperature=0.7,
-            max_tokens=250
+            payload_size=len(prompt_text),
+            temperature=0.7
         )
-
-        summary = response.choices[0].message.content.strip()
-        return jsonify({"summary": summary})
+        return jsonify({"summary": summary, "model_routing": routing})
 
     except Exception as e:
         return jsonify({"error": f"Ocorreu um erro ao gerar o resumo: {str(e)}"}), 500
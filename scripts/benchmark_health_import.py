@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do importador do Apple Health (src/api/health_import.py).
+
+Gera exports sintéticos de tamanhos crescentes e mede tempo e pico de memória (RSS)
+do importador em um processo separado para cada tamanho. O pico deve ficar estável
+conforme o arquivo cresce.
+
+    python scripts/benchmark_health_import.py --sizes-mb 256 1024 4096
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+]>
+<HealthData locale="pt_BR">
+ <ExportDate value="2025-09-22 08:00:00 -0300"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01"/>
+"""
+
+RECORD = (' <Record type="{type}" sourceName="{source}" sourceVersion="17.0" unit="{unit}" '
+          'creationDate="{day} {hour:02d}:10:00 -0300" startDate="{day} {hour:02d}:00:00 -0300" '
+          'endDate="{day} {hour:02d}:09:00 -0300" value="{value}">\n'
+          '  <MetadataEntry key="HKWasUserEntered" value="0"/>\n'
+          ' </Record>\n')
+
+SLEEP = (' <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Apple Watch" sourceVersion="10.0" '
+         'creationDate="{day} 07:00:00 -0300" startDate="{day} {start}:00 -0300" '
+         'endDate="{day} {end}:00 -0300" value="{value}"/>\n')
+
+QUANTITIES = [
+    ('HKQuantityTypeIdentifierStepCount', 'count', '120'),
+    ('HKQuantityTypeIdentifierActiveEnergyBurned', 'kcal', '12.5'),
+    ('HKQuantityTypeIdentifierAppleExerciseTime', 'min', '1'),
+    ('HKQuantityTypeIdentifierDistanceWalkingRunning', 'km', '0.09'),
+]
+
+
+def generate_export(path, target_bytes, history_days=3650):
+    """Escrever um export.xml sintético com aproximadamente target_bytes bytes"""
+    first_day = date(2015, 1, 1)
+    written = 0
+    index = 0
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(HEADER)
+        while written < target_bytes:
+            day = (first_day + timedelta(days=index % history_days)).isoformat()
+            chunk = []
+            for hour in range(24):
+                for record_type, unit, value in QUANTITIES:
+                    for source in ('iPhone', 'Apple Watch'):
+                        chunk.append(RECORD.format(type=record_type, source=source, unit=unit,
+                                                   day=day, hour=hour, value=value))
+            chunk.append(SLEEP.format(day=day, start='00:30', end='02:00',
+                                      value='HKCategoryValueSleepAnalysisAsleepCore'))
+            chunk.append(SLEEP.format(day=day, start='02:00', end='03:10',
+                                      value='HKCategoryValueSleepAnalysisAsleepDeep'))
+            chunk.append(SLEEP.format(day=day, start='03:10', end='04:40',
+                                      value='HKCategoryValueSleepAnalysisAsleepREM'))
+            data = ''.join(chunk)
+            output.write(data)
+            written += len(data)
+            index += 1
+        output.write('</HealthData>\n')
+
+
+def run_import(path):
+    """Rodar o importador em um processo filho e retornar (segundos, pico de RSS em MB)"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'src.api.health_import', path, '--output', os.devnull],
+        cwd=ROOT, stderr=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    if status != 0:
+        raise RuntimeError(f"import failed with status {status}")
+    # ru_maxrss é em KB no Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Apple Health importer on synthetic exports")
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[256, 1024, 4096])
+    parser.add_argument('--workdir', default=os.environ.get('TMPDIR', '/tmp'))
+    parser.add_argument('--keep', action='store_true', help="keep the generated files")
+    args = parser.parse_args()
+
+    print(f"{'size (MB)':>10} {'time (s)':>10} {'MB/s':>8} {'peak RSS (MB)':>14}")
+    for size_mb in args.sizes_mb:
+        path = os.path.join(args.workdir, f"synthetic-export-{size_mb}mb.xml")
+        if not os.path.exists(path):
+            generate_export(path, size_mb * 1024 * 1024)
+        try:
+            elapsed, peak_mb = run_import(path)
+            actual_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{actual_mb:>10.0f} {elapsed:>10.1f} {actual_mb / elapsed:>8.1f} {peak_mb:>14.1f}")
+        finally:
+            if not args.keep:
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import os
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from flask import request, jsonify
+from sendgrid.helpers.eventwebhook import EventWebhook
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do lote gravado no armazenamento e intervalo máximo entre gravações
+DELIVERY_BATCH_SIZE = int(os.environ.get('DELIVERY_BATCH_SIZE', '500'))
+DELIVERY_FLUSH_INTERVAL = float(os.environ.get('DELIVERY_FLUSH_INTERVAL', '1.0'))
+# Limite do buffer em memória; acima disso os eventos mais antigos são descartados
+DELIVERY_MAX_BUFFERED = int(os.environ.get('DELIVERY_MAX_BUFFERED', '100000'))
+# Quantas mensagens guardamos no histórico de cada usuário
+DELIVERY_HISTORY_PER_USER = int(os.environ.get('DELIVERY_HISTORY_PER_USER', '500'))
+# Quantas mensagens (LRU) e quantos eventos por mensagem ficam em memória
+DELIVERY_MAX_MESSAGES = int(os.environ.get('DELIVERY_MAX_MESSAGES', '200000'))
+DELIVERY_EVENTS_PER_MESSAGE = int(os.environ.get('DELIVERY_EVENTS_PER_MESSAGE', '20'))
+
+# Ordem dos status: um evento atrasado nunca sobrescreve um status mais avançado
+STATUS_RANK = {
+    'accepted': 0,
+    'queued': 1,
+    'processed': 1,
+    'sending': 2,
+    'deferred': 2,
+    'sent': 3,
+    'delivered': 4,
+    'undelivered': 4,
+    'failed': 4,
+    'bounced': 4,
+    'dropped': 4,
+    'read': 5
+}
+
+# Eventos do SendGrid -> status normalizado
+SENDGRID_STATUSES = {
+    'processed': 'processed',
+    'deferred': 'deferred',
+    'delivered': 'delivered',
+    'bounce': 'bounced',
+    'blocked': 'bounced',
+    'dropped': 'dropped',
+    'open': 'read'
+}
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class DeliveryStatusStore:
+    """
+    Armazenamento (em memória) do status de entrega, indexado por id da mensagem e por usuário.
+    Recebe eventos em lote através de write_batch. As mensagens formam um LRU limitado
+    a max_messages, e cada mensagem guarda apenas os últimos eventos.
+    """
+
+    def __init__(self, history_per_user=DELIVERY_HISTORY_PER_USER, max_messages=DELIVERY_MAX_MESSAGES,
+                 events_per_message=DELIVERY_EVENTS_PER_MESSAGE):
+        self.history_per_user = history_per_user
+        self.max_messages = max_messages
+        self.events_per_message = events_per_message
+        self._messages = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def _record(self, message_id, channel, status, timestamp):
+        record = self._messages.get(message_id)
+        if record is None:
+            record = self._messages[message_id] = {
+                'message_id': message_id,
+                'channel': channel,
+                'status': status,
+                'user_id': None,
+                'created_at': timestamp,
+                'updated_at': timestamp,
+                'error': None,
+                'events': deque(maxlen=self.events_per_message)
+            }
+            while len(self._messages) > self.max_messages:
+                self._messages.popitem(last=False)
+        else:
+            self._messages.move_to_end(message_id)
+        return record
+
+    def _assign_user(self, record, user_id):
+        # O dono de uma mensagem é definido uma única vez e nunca trocado depois
+        if not user_id or record['user_id'] is not None:
+            return
+        record['user_id'] = user_id
+        history = self._by_user.get(user_id)
+        if history is None:
+            history = self._by_user[user_id] = deque(maxlen=self.history_per_user)
+        history.append(record['message_id'])
+
+    def register_message(self, message_id, user_id, channel, status=None):
+        """Associar uma mensagem enviada ao usuário, para que os callbacks sejam encontrados depois"""
+        if not message_id:
+            return
+        with self._lock:
+            record = self._record(message_id, channel, status or 'accepted', _now_iso())
+            self._assign_user(record, user_id)
+
+    def write_batch(self, events):
+        with self._lock:
+            for event in events:
+                record = self._record(event['message_id'], event['channel'], event['status'], event['timestamp'])
+
+                record['events'].append({
+                    'status': event['status'],
+                    'timestamp': event['timestamp'],
+                    'error': event.get('error')
+                })
+
+                if STATUS_RANK.get(event['status'], 0) >= STATUS_RANK.get(record['status'], 0):
+                    record['status'] = event['status']
+                    record['updated_at'] = event['timestamp']
+                    if event.get('error'):
+                        record['error'] = event['error']
+
+                self._assign_user(record, event.get('user_id'))
+
+    def get_message(self, message_id):
+        with self._lock:
+            record = self._messages.get(message_id)
+            return dict(record, events=list(record['events'])) if record else None
+
+    def history(self, user_id, limit=50):
+        """Histórico de entregas do usuário, da mensagem mais recente para a mais antiga"""
+        with self._lock:
+            records = (self._messages.get(message_id) for message_id in reversed(self._by_user.get(user_id, ())))
+            history = []
+            for record in records:
+                # Mensagens já removidas do LRU são ignoradas
+                if record is not None and record['user_id'] == user_id:
+                    history.append(dict(record, events=list(record['events'])))
+                    if len(history) >= limit:
+                        break
+            return history
+
+
+class DeliveryEventBuffer:
+    """
+    Buffer em memória para eventos de entrega. Os webhooks só fazem append (O(1));
+    uma thread em segundo plano grava os eventos no armazenamento em lotes.
+    """
+
+    def __init__(self, store, batch_size=DELIVERY_BATCH_SIZE, flush_interval=DELIVERY_FLUSH_INTERVAL,
+                 max_buffered=DELIVERY_MAX_BUFFERED):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._events = deque()
+        self._max_buffered = max_buffered
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='delivery-status-flusher', daemon=True)
+            self._thread.start()
+
+    def add_many(self, events):
+        with self._lock:
+            for event in events:
+                if len(self._events) >= self._max_buffered:
+                    self._events.popleft()
+                    self.dropped += 1
+                self._events.append(event)
+            pending = len(self._events)
+            self._ensure_flusher()
+
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def add(self, event):
+        self.add_many([event])
+
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def flush(self):
+        """Gravar todos os eventos pendentes no armazenamento, em lotes"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._events:
+                        break
+                    count = min(self.batch_size, len(self._events))
+                    batch = [self._events.popleft() for _ in range(count)]
+                try:
+                    self.store.write_batch(batch)
+                    written += len(batch)
+                except Exception as e:
+                    logger.error("Error writing %d delivery events: %s", len(batch), e)
+        return written
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def verify_twilio_signature(url, form, signature, auth_token):
+    """Validar o X-Twilio-Signature: HMAC-SHA1 (base64) da URL + parâmetros ordenados"""
+    if not auth_token or not signature:
+        return False
+    data = url + ''.join(key + value for key in sorted(form) for value in form.getlist(key))
+    expected = base64.b64encode(hmac.new(auth_token.encode('utf-8'), data.encode('utf-8'), hashlib.sha1).digest())
+    return hmac.compare_digest(expected.decode('ascii'), signature)
+
+
+def verify_sendgrid_signature(payload, signature, timestamp, public_key):
+    """Validar a assinatura ECDSA do SendGrid Signed Event Webhook"""
+    if not public_key or not signature or not timestamp:
+        return False
+    try:
+        return EventWebhook(public_key).verify_signature(payload, signature, timestamp)
+    except Exception as e:
+        logger.warning("Invalid SendGrid webhook signature: %s", e)
+        return False
+
+
+def parse_twilio_status(form):
+    """Converter o status callback do Twilio (form-encoded) em um evento normalizado"""
+    message_id = form.get('MessageSid') or form.get('SmsSid')
+    status = (form.get('MessageStatus') or form.get('SmsStatus') or '').lower()
+    if not message_id or not status:
+        return None
+
+    channel = 'whatsapp' if (form.get('To') or '').startswith('whatsapp:') else 'sms'
+    error_code = form.get('ErrorCode')
+    return {
+        'message_id': message_id,
+        'channel': channel,
+        'status': status,
+        'timestamp': _now_iso(),
+        'error': f"Twilio error {error_code}" if error_code else None
+    }
+
+
+def parse_sendgrid_events(payload):
+    """Converter os eventos do SendGrid Event Webhook em eventos normalizados"""
+    events = []
+    for item in payload or []:
+        # Itens malformados são ignorados: um 5xx faria o SendGrid reenviar o lote inteiro
+        if not isinstance(item, dict):
+            continue
+        event = item.get('event')
+        message_id = item.get('sg_message_id')
+        status = SENDGRID_STATUSES.get(event) if isinstance(event, str) else None
+        if not status or not isinstance(message_id, str) or not message_id:
+            continue
+        user_id = item.get('user_id')
+
+        timestamp = item.get('timestamp')
+        events.append({
+            # sg_message_id = "<X-Message-Id>.filterdrecv-..."; indexamos pelo X-Message-Id
+            'message_id': message_id.split('.', 1)[0],
+            'channel': 'email',
+            'status': status,
+            'user_id': user_id if isinstance(user_id, str) else None,
+            'timestamp': (datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+                          if isinstance(timestamp, (int, float)) else _now_iso()),
+            'error': item.get('reason') if isinstance(item.get('reason'), str) else None
+        })
+    return events
+
+
+# Instâncias globais
+delivery_status_store = DeliveryStatusStore()
+delivery_event_buffer = DeliveryEventBuffer(delivery_status_store)
+
+
+def create_delivery_status_routes(app):
+    """Criar rotas de webhooks de status de entrega e consulta de histórico"""
+
+    @app.route('/api/webhooks/twilio/status', methods=['POST'])
+    def twilio_status_callback():
+        auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
+        signature = request.headers.get('X-Twilio-Signature')
+        # Atrás de proxy a URL vista pelo Flask pode diferir da configurada no Twilio
+        urls = [request.url, os.environ.get('TWILIO_STATUS_CALLBACK_URL')]
+        if not any(url and verify_twilio_signature(url, request.form, signature, auth_token) for url in urls):
+            return jsonify({"error": "Invalid Twilio signature"}), 403
+
+        event = parse_twilio_status(request.form)
+        if event is None:
+            return jsonify({"error": "MessageSid and MessageStatus are required"}), 400
+
+        delivery_event_buffer.add(event)
+        return '', 204
+
+    @app.route('/api/webhooks/sendgrid/events', methods=['POST'])
+    def sendgrid_event_webhook():
+        raw_body = request.get_data(as_text=True)
+        if not verify_sendgrid_signature(
+            raw_body,
+            request.headers.get('X-Twilio-Email-Event-Webhook-Signature'),
+            request.headers.get('X-Twilio-Email-Event-Webhook-Timestamp'),
+            os.environ.get('SENDGRID_WEBHOOK_PUBLIC_KEY')
+        ):
+            return jsonify({"error": "Invalid SendGrid signature"}), 403
+
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, list):
+            return jsonify({"error": "Expected a JSON array of events"}), 400
+
+        delivery_event_buffer.add_many(parse_sendgrid_events(payload))
+        return '', 204
+
+    @app.route('/api/delivery-status/<user_id>', methods=['GET'])
+    def delivery_history(user_id):
+        try:
+            limit = max(1, min(int(request.args.get('limit', 50)), DELIVERY_HISTORY_PER_USER))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+
+        # Lê só o que já foi gravado; eventos no buffer aparecem após o próximo flush
+        # (DELIVERY_FLUSH_INTERVAL), sem drenar o buffer na thread da requisição
+        return jsonify({
+            "user_id": user_id,
+            "messages": delivery_status_store.history(user_id, limit)
+        })
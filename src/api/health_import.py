@@ -0,0 +1,435 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+from flask import request, jsonify
+
+logger = logging.getLogger(__name__)
+
+# Quantos dias são gravados por lote no histórico
+IMPORT_WRITE_BATCH = int(os.environ.get('HEALTH_IMPORT_WRITE_BATCH', '500'))
+# A cada quantos elementos <Record> o progresso é reportado
+IMPORT_PROGRESS_EVERY = int(os.environ.get('HEALTH_IMPORT_PROGRESS_EVERY', '100000'))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Tamanho máximo do upload (o export.xml de anos de dados passa facilmente de 1 GB)
+IMPORT_MAX_BYTES = int(os.environ.get('HEALTH_IMPORT_MAX_BYTES', str(4 * 1024 ** 3)))
+# Quantas importações podem rodar ao mesmo tempo; acima disso o upload recebe 429
+IMPORT_MAX_JOBS = int(os.environ.get('HEALTH_IMPORT_MAX_JOBS', '2'))
+# Por quanto tempo (segundos) o status de uma importação terminada continua disponível
+IMPORT_JOB_TTL = int(os.environ.get('HEALTH_IMPORT_JOB_TTL', '3600'))
+
+# Tipo do Apple Health -> (seção, campo) no payload do resumo diário
+QUANTITY_TYPES = {
+    'HKQuantityTypeIdentifierStepCount': ('activity', 'stepCount'),
+    'HKQuantityTypeIdentifierActiveEnergyBurned': ('activity', 'activeEnergyBurned'),
+    'HKQuantityTypeIdentifierAppleExerciseTime': ('activity', 'appleExerciseTime'),
+    'HKQuantityTypeIdentifierDistanceWalkingRunning': ('activity', 'distanceWalkingRunning'),
+}
+SLEEP_TYPE = 'HKCategoryTypeIdentifierSleepAnalysis'
+
+# Conversão para as unidades do payload (kcal, km)
+UNIT_FACTORS = {
+    'kJ': 1 / 4.184,
+    'mi': 1.609344,
+    'm': 0.001,
+}
+
+# Estágios de sono -> campos de sleep (totalDuration soma todos os estágios "Asleep")
+SLEEP_STAGES = {
+    'HKCategoryValueSleepAnalysisAsleep': (('sleep', 'totalDuration'),),
+    'HKCategoryValueSleepAnalysisAsleepUnspecified': (('sleep', 'totalDuration'),),
+    'HKCategoryValueSleepAnalysisAsleepCore': (('sleep', 'totalDuration'),),
+    'HKCategoryValueSleepAnalysisAsleepDeep': (('sleep', 'totalDuration'), ('sleep', 'deepSleepDuration')),
+    'HKCategoryValueSleepAnalysisAsleepREM': (('sleep', 'totalDuration'), ('sleep', 'remSleepDuration')),
+}
+
+ROUNDING = {
+    'stepCount': 0,
+    'activeEnergyBurned': 0,
+    'appleExerciseTime': 0,
+    'distanceWalkingRunning': 2,
+    'totalDuration': 0,
+    'deepSleepDuration': 0,
+    'remSleepDuration': 0,
+}
+
+APPLE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S %z'
+
+
+class HealthHistoryStore:
+    """Histórico diário de métricas (em memória), gravado em lote e indexado pelo id do histórico"""
+
+    def __init__(self):
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def write_many(self, history_id, daily_metrics):
+        with self._lock:
+            history = self._days.setdefault(history_id, {})
+            for day in daily_metrics:
+                history[day['reportDate']] = day
+
+    def get(self, history_id, start=None, end=None):
+        with self._lock:
+            history = dict(self._days.get(history_id, {}))
+        return [
+            history[day] for day in sorted(history)
+            if (start is None or day >= start) and (end is None or day <= end)
+        ]
+
+
+class _CountingReader:
+    """Envolve o arquivo para saber quantos bytes já foram lidos (progresso)"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class DailyAggregator:
+    """
+    Soma os registros por (dia, campo, fonte). No fim, cada campo usa a fonte com o
+    maior total do dia, já que iPhone e Apple Watch registram os mesmos passos.
+    A memória cresce com o número de dias, não com o tamanho do arquivo.
+    """
+
+    def __init__(self):
+        self._totals = {}
+
+    def _add(self, day, field, source, value):
+        sources = self._totals.setdefault((day, field), {})
+        sources[source] = sources.get(source, 0.0) + value
+
+    def add_record(self, attrib):
+        record_type = attrib.get('type')
+
+        if record_type in QUANTITY_TYPES:
+            try:
+                value = float(attrib['value'])
+            except (KeyError, ValueError):
+                return False
+            value *= UNIT_FACTORS.get(attrib.get('unit'), 1.0)
+            day = attrib.get('startDate', '')[:10]
+            self._add(day, QUANTITY_TYPES[record_type], attrib.get('sourceName', ''), value)
+            return True
+
+        if record_type == SLEEP_TYPE:
+            fields = SLEEP_STAGES.get(attrib.get('value'))
+            if not fields:
+                return False
+            try:
+                start = datetime.strptime(attrib['startDate'], APPLE_DATE_FORMAT)
+                end = datetime.strptime(attrib['endDate'], APPLE_DATE_FORMAT)
+            except (KeyError, ValueError):
+                return False
+            # A noite de sono conta para o dia em que a pessoa acordou
+            minutes = (end - start).total_seconds() / 60
+            for field in fields:
+                self._add(attrib['endDate'][:10], field, attrib.get('sourceName', ''), minutes)
+            return True
+
+        return False
+
+    def daily_metrics(self):
+        days = {}
+        for (day, (section, field)), sources in self._totals.items():
+            value = round(max(sources.values()), ROUNDING[field])
+            if ROUNDING[field] == 0:
+                value = int(value)
+            days.setdefault(day, {'reportDate': day}).setdefault(section, {})[field] = value
+        return [days[day] for day in sorted(days)]
+
+
+def parse_export(fileobj, total_bytes=None, progress=None, progress_every=IMPORT_PROGRESS_EVERY):
+    """
+    Ler um export.xml do Apple Health de forma incremental e retornar as métricas diárias.
+    Cada elemento é descartado assim que processado, então a memória não depende do tamanho do arquivo.
+    """
+    reader = _CountingReader(fileobj)
+    aggregator = DailyAggregator()
+    records_seen = 0
+    records_used = 0
+    root = None
+
+    def report(done=False):
+        if progress is None:
+            return
+        progress({
+            "bytes_read": reader.bytes_read,
+            "total_bytes": total_bytes,
+            "percent": round(100.0 * reader.bytes_read / total_bytes, 1) if total_bytes else None,
+            "records_seen": records_seen,
+            "records_used": records_used,
+            "done": done
+        })
+
+    for event, elem in ET.iterparse(reader, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == 'Record':
+            records_seen += 1
+            if aggregator.add_record(elem.attrib):
+                records_used += 1
+            if records_seen % progress_every == 0:
+                report()
+
+        if elem is not root:
+            elem.clear()
+            # Remove os filhos já processados do elemento raiz (HealthData)
+            root.clear()
+
+    report(done=True)
+    return aggregator.daily_metrics()
+
+
+def open_export(path):
+    """Abrir export.xml diretamente ou de dentro do export.zip. Retorna (arquivo, tamanho)."""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        for info in archive.infolist():
+            if info.filename.endswith('export.xml') and not info.filename.endswith('export_cda.xml'):
+                return archive.open(info), info.file_size
+        archive.close()
+        raise ValueError("export.xml not found in zip file")
+    return open(path, 'rb'), os.path.getsize(path)
+
+
+def import_export_file(path, history_id, store, progress=None):
+    """Importar um arquivo de export para um histórico, gravando em lotes"""
+    fileobj, total_bytes = open_export(path)
+    with fileobj:
+        daily_metrics = parse_export(fileobj, total_bytes, progress)
+
+    for start in range(0, len(daily_metrics), IMPORT_WRITE_BATCH):
+        store.write_many(history_id, daily_metrics[start:start + IMPORT_WRITE_BATCH])
+    return daily_metrics
+
+
+class ImportJob:
+    def __init__(self, path):
+        self.id = uuid.uuid4().hex
+        # Sem autenticação não há usuário confiável: cada importação grava num histórico
+        # novo, com chave gerada no servidor, e nunca sobrescreve o histórico de outra pessoa
+        self.history_id = uuid.uuid4().hex
+        self.path = path
+        self.status = 'queued'
+        self.progress = {}
+        self.days_imported = 0
+        self.error = None
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at = None
+        self.expires_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "history_id": self.history_id,
+            "history_url": f"/api/health-history/{self.history_id}",
+            "status": self.status,
+            "progress": self.progress,
+            "days_imported": self.days_imported,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+def _run_import_job(job, store):
+    job.status = 'running'
+
+    def update_progress(progress):
+        job.progress = progress
+
+    try:
+        daily_metrics = import_export_file(job.path, job.history_id, store, update_progress)
+        job.days_imported = len(daily_metrics)
+        job.status = 'completed'
+        logger.info("Health import %s finished: %d days", job.id, job.days_imported)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        logger.error("Health import %s failed: %s", job.id, e)
+    finally:
+        job.finished_at = datetime.now(timezone.utc).isoformat()
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+
+class ImportJobRegistry:
+    """
+    Importações em andamento e terminadas. Limita quantas rodam ao mesmo tempo
+    e esquece as terminadas depois de job_ttl segundos.
+    """
+
+    def __init__(self, max_running=IMPORT_MAX_JOBS, job_ttl=IMPORT_JOB_TTL):
+        self.max_running = max_running
+        self.job_ttl = job_ttl
+        self._jobs = OrderedDict()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.expires_at and job.expires_at <= now]:
+            del self._jobs[job_id]
+
+    def reserve(self):
+        """Reservar uma vaga antes de receber o upload; False se o limite foi atingido"""
+        with self._lock:
+            self._expire()
+            if self._running >= self.max_running:
+                return False
+            self._running += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._running = max(0, self._running - 1)
+
+    def start(self, job, store):
+        """Rodar a importação em segundo plano, usando a vaga já reservada"""
+        with self._lock:
+            self._jobs[job.id] = job
+
+        def run():
+            try:
+                _run_import_job(job, store)
+            finally:
+                job.expires_at = time.time() + self.job_ttl
+                self.release()
+
+        threading.Thread(target=run, name=f'health-import-{job.id}', daemon=True).start()
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _copy_limited(source, destination, max_bytes):
+    """Copiar em blocos, interrompendo assim que o limite de tamanho for ultrapassado"""
+    copied = 0
+    while True:
+        chunk = source.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise UploadTooLarge()
+        destination.write(chunk)
+
+
+# Instâncias globais
+health_history_store = HealthHistoryStore()
+import_jobs = ImportJobRegistry()
+
+
+def create_health_import_routes(app):
+    """Criar rotas de importação do Apple Health e consulta do histórico"""
+
+    @app.route('/api/health-history/import', methods=['POST'])
+    def import_health_export():
+        # Recusa antes de ler o corpo quando o tamanho declarado já passa do limite
+        if request.content_length is not None and request.content_length > IMPORT_MAX_BYTES:
+            return jsonify({"error": "Export file too large", "max_bytes": IMPORT_MAX_BYTES}), 413
+
+        if not import_jobs.reserve():
+            response = jsonify({"error": "Too many imports in progress, try again later"})
+            response.headers['Retry-After'] = '60'
+            return response, 429
+
+        # O upload vai para disco em blocos; o parse roda em segundo plano
+        fd, path = tempfile.mkstemp(prefix='health-export-', suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as destination:
+                upload = request.files.get('file')
+                size = _copy_limited(upload.stream if upload is not None else request.stream,
+                                     destination, IMPORT_MAX_BYTES)
+        except UploadTooLarge:
+            os.remove(path)
+            import_jobs.release()
+            return jsonify({"error": "Export file too large", "max_bytes": IMPORT_MAX_BYTES}), 413
+        except Exception as e:
+            os.remove(path)
+            import_jobs.release()
+            logger.error("Error receiving health export: %s", e)
+            return jsonify({"error": str(e)}), 500
+
+        if size == 0:
+            os.remove(path)
+            import_jobs.release()
+            return jsonify({"error": "Empty export file"}), 400
+
+        job = ImportJob(path)
+        import_jobs.start(job, health_history_store)
+
+        return jsonify(dict(job.to_dict(), status_url=f"/api/health-history/import/{job.id}")), 202
+
+    @app.route('/api/health-history/import/<job_id>', methods=['GET'])
+    def health_import_status(job_id):
+        job = import_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Import job not found"}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/health-history/<history_id>', methods=['GET'])
+    def health_history(history_id):
+        return jsonify({
+            "history_id": history_id,
+            "days": health_history_store.get(history_id, request.args.get('from'), request.args.get('to'))
+        })
+
+
+def main(argv=None):
+    """CLI: python -m src.api.health_import export.xml [--output daily.json]"""
+    parser = argparse.ArgumentParser(description="Import an Apple Health export into daily summary metrics")
+    parser.add_argument('path', help="export.xml or export.zip")
+    parser.add_argument('--history-id', default='cli', help="key used in the history store")
+    parser.add_argument('--output', help="write the daily metrics as JSON to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def print_progress(progress):
+        percent = f"{progress['percent']}%" if progress['percent'] is not None else f"{progress['bytes_read']} bytes"
+        print(f"[{time.perf_counter() - started:8.1f}s] {percent} - {progress['records_seen']} records, "
+              f"{progress['records_used']} used", file=sys.stderr)
+
+    daily_metrics = import_export_file(args.path, args.history_id, health_history_store, print_progress)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(daily_metrics, output, ensure_ascii=False, indent=2)
+    else:
+        json.dump(daily_metrics, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+
+    print(f"Imported {len(daily_metrics)} days in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
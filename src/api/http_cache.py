@@ -0,0 +1,227 @@
+import os
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele usamos apenas gzip
+    brotli = None
+
+# Políticas de cache por rota. Nas rotas com "ttl" o servidor lembra, por esse
+# tempo (em segundos), o ETag emitido para uma requisição e responde 304 sem
+# executar a view novamente (ou seja, sem chamar a OpenAI). Sem "ttl", a view
+# sempre roda e o ETag é comparado com o corpo recém-gerado, então mudanças nos
+# dados aparecem imediatamente.
+CACHE_POLICIES = {
+    '/api/generate-summary': {
+        'cache_control': 'private, no-cache',
+        'ttl': 24 * 60 * 60
+    },
+    '/api/analysis/personalized': {
+        'cache_control': 'private, no-cache',
+        'ttl': 24 * 60 * 60
+    },
+    '/api/user/profile': {
+        'cache_control': 'private, max-age=60, must-revalidate',
+        'ttl': None
+    }
+}
+
+# Corpos menores que isso não compensam o custo de compressão
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+MAX_TRACKED_VALIDATORS = int(os.environ.get('MAX_TRACKED_VALIDATORS', '10000'))
+
+# Sufixo adicionado ao ETag de cada codificação, já que um ETag forte
+# precisa ser diferente para cada representação do recurso
+ENCODING_SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+
+
+class ValidatorStore:
+    """Mapa (LRU) de impressão digital da requisição -> último ETag emitido"""
+
+    def __init__(self, max_entries=MAX_TRACKED_VALIDATORS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna (etag, tamanho do corpo) ou None se não houver ETag válido"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            etag, size, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return etag, size
+
+    def set(self, key, etag, size, ttl):
+        with self._lock:
+            self._entries[key] = (etag, size, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+validator_store = ValidatorStore()
+
+
+def _request_fingerprint():
+    """Identifica a requisição pelo que determina a resposta: rota, query, corpo e credenciais"""
+    body = request.get_data(cache=True)
+    try:
+        # Normaliza o JSON para que a ordem das chaves não mude o resultado
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except ValueError:
+        pass
+
+    digest = hashlib.sha256()
+    digest.update(request.method.encode('utf-8'))
+    digest.update(b'\0' + request.path.encode('utf-8'))
+    digest.update(b'\0' + '&'.join(sorted(request.query_string.decode('latin-1').split('&'))).encode('latin-1'))
+    digest.update(b'\0' + request.headers.get('Authorization', '').encode('utf-8'))
+    digest.update(b'\0' + body)
+    return digest.hexdigest()
+
+
+def _compute_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def _parse_if_none_match(header):
+    """Retorna os ETags (sem aspas, W/ ou sufixo de codificação) enviados pelo cliente"""
+    tags = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        for suffix in ENCODING_SUFFIXES.values():
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)]
+                break
+        if tag:
+            tags.add(tag)
+    return tags
+
+
+def _etag_matches(header, etag):
+    tags = _parse_if_none_match(header)
+    # "*" só faz sentido para leitura; num POST ele descartaria um resumo já gerado
+    if '*' in tags and request.method in ('GET', 'HEAD'):
+        return True
+    return etag in tags
+
+
+def _negotiate_encoding():
+    """Escolhe br ou gzip a partir do Accept-Encoding, respeitando q=0"""
+    accepted = {}
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+
+    if brotli is not None and accepted.get('br', accepted.get('*', 0)) > 0:
+        return 'br'
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def _format_etag(etag, encoding):
+    return '"%s%s"' % (etag, ENCODING_SUFFIXES.get(encoding, ''))
+
+
+def _apply_cache_headers(response, policy, etag, encoding):
+    response.headers['ETag'] = _format_etag(etag, encoding)
+    response.headers['Cache-Control'] = policy['cache_control']
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _not_modified(policy, etag, encoding):
+    response = current_app.response_class(status=304)
+    return _apply_cache_headers(response, policy, etag, encoding)
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def answer_conditional_request():
+    """before_request: responde 304 sem executar a view quando o ETag do cliente ainda é válido"""
+    policy = CACHE_POLICIES.get(request.path)
+    if policy is None or not policy['ttl'] or request.method not in ('GET', 'POST'):
+        return None
+
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return None
+
+    entry = validator_store.get(_request_fingerprint())
+    if entry is None or not _etag_matches(if_none_match, entry[0]):
+        return None
+
+    etag, size = entry
+    encoding = _negotiate_encoding() if size >= COMPRESSION_MIN_SIZE else None
+    return _not_modified(policy, etag, encoding)
+
+
+def finalize_response(response):
+    """after_request: adiciona ETag/Cache-Control por rota e comprime corpos grandes"""
+    if response.direct_passthrough or response.status_code != 200:
+        return response
+    if 'Content-Encoding' in response.headers:
+        return response
+
+    body = response.get_data()
+    policy = CACHE_POLICIES.get(request.path)
+    encoding = _negotiate_encoding() if len(body) >= COMPRESSION_MIN_SIZE else None
+
+    if policy is not None:
+        etag = _compute_etag(body)
+        if policy['ttl']:
+            validator_store.set(_request_fingerprint(), etag, len(body), policy['ttl'])
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return _not_modified(policy, etag, encoding)
+
+        _apply_cache_headers(response, policy, etag, encoding)
+
+    if encoding is not None:
+        response.set_data(_compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+
+    return response
+
+
+def init_http_cache(app):
+    """Registrar ETags, respostas 304 e compressão na aplicação"""
+    app.before_request(answer_conditional_request)
+    app.after_request(finalize_response)
+    return app
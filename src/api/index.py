@@ -4,10 +4,29 @@ import openai
 import os
 import json
 from datetime import datetime
+from src.api.health_import import create_health_import_routes
+from src.api.http_cache import init_http_cache
+from src.api.logging_setup import configure_logging, init_request_logging
+from src.api.model_router import model_router
+from src.api.notifications import create_notification_routes
+
+configure_logging()
 
 app = Flask(__name__)
 CORS(app)
 
+# Request id por requisição nos logs (antes do cache, para valer também nas respostas 304)
+init_request_logging(app)
+
+# ETags, respostas 304 e compressão para resumo, análise e perfil
+init_http_cache(app)
+
+# Importação do histórico do Apple Health (export.xml)
+create_health_import_routes(app)
+
+# Notificações e webhooks de status de entrega (Twilio/SendGrid)
+create_notification_routes(app)
+
 # Configurar OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
@@ -22,7 +41,8 @@ def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "version": "1.1.0",
-        "firebase_enabled": False
+        "firebase_enabled": False,
+        "model_stats": model_router.stats()
     })
 
 @app.route('/api/generate-summary', methods=['POST'])
@@ -58,18 +78,18 @@ def generate_summary():
         
         client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        # Modelo e max_tokens escolhidos pelo roteador (tamanho, tier, latência)
+        summary, routing = model_router.complete(
+            client,
+            "summary",
             messages=[
                 {"role": "system", "content": "Você é um coach de saúde motivacional que fala português brasileiro."},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=200,
+            payload_size=len(prompt),
             temperature=0.7
         )
         
-        summary = response.choices[0].message.content.strip()
-        
         return jsonify({
             "summary": summary,
             "data": {
@@ -77,6 +97,7 @@ def generate_summary():
                 "calories": calories,
                 "sleep_hours": sleep_hours
             },
+            "model_routing": routing,
             "timestamp": datetime.now().isoformat()
         })
         
@@ -301,18 +322,17 @@ def generate_personalized_analysis():
         
         client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        analysis, routing = model_router.complete(
+            client,
+            "analysis",
             messages=[
                 {"role": "system", "content": "Você é um coach de saúde que cria análises altamente personalizadas."},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=250,
+            payload_size=len(prompt),
             temperature=0.7
         )
         
-        analysis = response.choices[0].message.content.strip()
-        
         return jsonify({
             "analysis": analysis,
             "personalized": True,
@@ -328,6 +348,7 @@ def generate_personalized_analysis():
                 "calories": calories,
                 "sleep_hours": sleep_hours
             },
+            "model_routing": routing,
             "timestamp": datetime.now().isoformat()
         })
         
@@ -361,7 +382,14 @@ def root():
             "/api/onboarding/start",
             "/api/onboarding/answer",
             "/api/analysis/personalized",
-            "/api/user/profile"
+            "/api/user/profile",
+            "/api/health-history/import",
+            "/api/health-history/<history_id>",
+            "/api/send-wellness-summary",
+            "/api/notification-status",
+            "/api/webhooks/twilio/status",
+            "/api/webhooks/sendgrid/events",
+            "/api/delivery-status/<user_id>"
         ]
     })
 
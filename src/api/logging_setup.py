@@ -0,0 +1,146 @@
+import os
+import copy
+import json
+import atexit
+import logging
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Fração dos logs de sucesso (alto volume) que é realmente gravada; 1.0 grava todos
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', '1.0'))
+# Tamanho máximo dos corpos de resposta dos provedores (Twilio/SendGrid) nos logs
+LOG_BODY_LIMIT = int(os.environ.get('LOG_BODY_LIMIT', '500'))
+
+# Passar como extra= nos logs de sucesso para que sejam amostrados
+SUCCESS_LOG = {'sample_rate': LOG_SUCCESS_SAMPLE_RATE}
+
+request_id_var = ContextVar('request_id', default=None)
+
+_listener = None
+
+
+class TruncatedBody:
+    """
+    Corpo de resposta de um provedor, truncado apenas se o registro passar pelos filtros
+    (nível e amostragem). Aceita a própria resposta (usa response.text) ou uma string.
+    """
+
+    def __init__(self, body, limit=LOG_BODY_LIMIT):
+        self.body = body
+        self.limit = limit
+
+    def __str__(self):
+        text = self.body.text if hasattr(self.body, 'text') else str(self.body)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text) - self.limit} chars truncated)"
+
+
+class RequestContextFilter(logging.Filter):
+    """Anexa o request id ao registro (roda na thread da requisição)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Descarta uma fração dos registros marcados com sample_rate"""
+
+    def filter(self, record):
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate is None or sample_rate >= 1.0:
+            return True
+        return random.random() < sample_rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, 'request_id', None)
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        elif record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler que interpola a mensagem (e o traceback) na thread da requisição, para
+    que argumentos alterados depois não mudem o log; o JSON e a escrita ficam com o listener.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    """
+    Configurar o logging da aplicação: a thread da requisição só monta a mensagem e enfileira
+    o registro; uma thread em segundo plano gera o JSON e escreve. Chamadas repetidas são ignoradas.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def init_request_logging(app):
+    """Gerar (ou reaproveitar o X-Request-ID) um id por requisição e devolvê-lo na resposta"""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        request_id_var.set(g.request_id)
+
+    @app.after_request
+    def return_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    @app.teardown_request
+    def clear_request_id(exc):
+        request_id_var.set(None)
+
+    return app
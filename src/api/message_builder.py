@@ -0,0 +1,171 @@
+import os
+import re
+import unicodedata
+
+# Alfabeto padrão GSM 03.38 (1 septeto por caractere)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Tabela de extensão GSM (2 septetos: ESC + caractere)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+GSM7_SINGLE_SEGMENT = 160
+GSM7_MULTI_SEGMENT = 153
+UCS2_SINGLE_SEGMENT = 70
+UCS2_MULTI_SEGMENT = 67
+
+# Substituições que a decomposição Unicode não resolve sozinha
+TRANSLITERATIONS = {
+    '‘': "'", '’': "'", '‚': "'", '´': "'", '`': "'",
+    '“': '"', '”': '"', '„': '"', '«': '"', '»': '"',
+    '–': '-', '—': '-', '−': '-', '•': '-', '·': '-',
+    '…': '...', '\u00a0': ' ', '\t': ' ',
+    'ç': 'c', 'ª': 'a', 'º': 'o', '°': 'o',
+}
+
+# Orçamento de segmentos por canal. SMS é cobrado e limitado por segmento,
+# então transliteramos para ficar em GSM-7; no WhatsApp mantemos acentos e emoji.
+CHANNEL_BUDGETS = {
+    'sms': {
+        'max_segments': int(os.environ.get('SMS_MAX_SEGMENTS', '2')),
+        'transliterate': os.environ.get('SMS_TRANSLITERATE', 'true').lower() == 'true'
+    },
+    'whatsapp': {
+        'max_segments': int(os.environ.get('WHATSAPP_MAX_SEGMENTS', '4')),
+        'transliterate': os.environ.get('WHATSAPP_TRANSLITERATE', 'false').lower() == 'true'
+    }
+}
+
+TRUNCATION_MARK = '...'
+
+
+def is_gsm7(text):
+    return all(char in GSM7_BASIC or char in GSM7_EXTENDED for char in text)
+
+
+def detect_encoding(text):
+    return 'GSM-7' if is_gsm7(text) else 'UCS-2'
+
+
+def _char_units(char, encoding):
+    if encoding == 'GSM-7':
+        return 2 if char in GSM7_EXTENDED else 1
+    # Caracteres fora do BMP (emoji) ocupam um par de surrogates em UCS-2/UTF-16
+    return 2 if ord(char) > 0xFFFF else 1
+
+
+def count_segments(text):
+    """
+    Calcular codificação, tamanho (septetos ou unidades UTF-16) e número de segmentos.
+    Caracteres de 2 unidades nunca são divididos entre segmentos.
+    """
+    encoding = detect_encoding(text)
+    single, multi = ((GSM7_SINGLE_SEGMENT, GSM7_MULTI_SEGMENT) if encoding == 'GSM-7'
+                     else (UCS2_SINGLE_SEGMENT, UCS2_MULTI_SEGMENT))
+
+    units = [_char_units(char, encoding) for char in text]
+    length = sum(units)
+    if length == 0:
+        return {"encoding": encoding, "length": 0, "segments": 0}
+    if length <= single:
+        return {"encoding": encoding, "length": length, "segments": 1}
+
+    segments = 1
+    used = 0
+    for size in units:
+        if used + size > multi:
+            segments += 1
+            used = 0
+        used += size
+    return {"encoding": encoding, "length": length, "segments": segments}
+
+
+def transliterate_to_gsm7(text):
+    """Remover acentos, emoji e pontuação tipográfica que forçariam UCS-2"""
+    result = []
+    for char in text:
+        if char in GSM7_BASIC or char in GSM7_EXTENDED:
+            result.append(char)
+            continue
+        if char in TRANSLITERATIONS:
+            result.append(TRANSLITERATIONS[char])
+            continue
+        # "ã" -> "a" + til combinante; mantemos só a parte que existe em GSM-7
+        decomposed = unicodedata.normalize('NFKD', char)
+        result.append(''.join(c for c in decomposed if c in GSM7_BASIC or c in GSM7_EXTENDED))
+
+    text = ''.join(result)
+    # Emoji removidos costumam deixar espaços sobrando
+    text = re.sub(r'[ ]{2,}', ' ', text)
+    return '\n'.join(line.strip(' ') for line in text.split('\n'))
+
+
+def _fits(text, max_segments):
+    return count_segments(text)["segments"] <= max_segments
+
+
+def truncate_to_segments(text, max_segments, prefix='', suffix=''):
+    """
+    Cortar o texto em limite de palavra para que prefix + texto + suffix
+    caiba em max_segments. Retorna (texto, foi_truncado).
+    """
+    if _fits(prefix + text + suffix, max_segments):
+        return text, False
+
+    # Busca binária pelo maior prefixo que cabe (o nº de segmentos só cresce com o tamanho)
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _fits(prefix + text[:middle].rstrip() + TRUNCATION_MARK + suffix, max_segments):
+            low = middle
+        else:
+            high = middle - 1
+
+    cut = text[:low]
+    # Volta até o último espaço para não cortar uma palavra no meio
+    if low < len(text) and not text[low].isspace():
+        boundary = max(cut.rfind(' '), cut.rfind('\n'))
+        if boundary > 0:
+            cut = cut[:boundary]
+
+    cut = cut.rstrip(' \n,;:-')
+    return (cut + TRUNCATION_MARK if cut else ''), True
+
+
+def build_message(channel, body, prefix='', suffix=''):
+    """
+    Montar uma mensagem de SMS/WhatsApp dentro do orçamento de segmentos do canal.
+    Normalmente apenas o body é truncado e prefix/suffix (saudação, rodapé) são mantidos;
+    se eles sozinhos não couberem, a mensagem inteira é truncada.
+    """
+    budget = CHANNEL_BUDGETS[channel]
+    transliterated = False
+
+    if budget['transliterate']:
+        original = prefix + body + suffix
+        prefix, body, suffix = (transliterate_to_gsm7(prefix), transliterate_to_gsm7(body),
+                                transliterate_to_gsm7(suffix))
+        transliterated = (prefix + body + suffix) != original
+
+    max_segments = budget['max_segments']
+    full_text = prefix + body + suffix
+    body, truncated = truncate_to_segments(body, max_segments, prefix, suffix)
+    text = prefix + body + suffix
+
+    if not _fits(text, max_segments):
+        # Saudação e rodapé sozinhos já estouram o orçamento: corta a mensagem inteira
+        text, truncated = truncate_to_segments(full_text, max_segments)
+
+    info = count_segments(text)
+
+    return {
+        "text": text,
+        "encoding": info["encoding"],
+        "segments": info["segments"],
+        "length": info["length"],
+        "truncated": truncated,
+        "transliterated": transliterated,
+        # Orçamento impossível (ex.: max_segments=0): não há mensagem válida para enviar
+        "over_budget": info["segments"] > max_segments or not text.strip()
+    }
@@ -0,0 +1,235 @@
+import os
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Política padrão de roteamento. Pode ser sobrescrita (parcialmente) pela
+# variável de ambiente MODEL_ROUTER_POLICY com um JSON no mesmo formato.
+DEFAULT_POLICY = {
+    # Quantidade de chamadas recentes usadas para p95 e taxa de erro
+    "window_size": 100,
+    # Amostras mais antigas que isso são ignoradas, permitindo que um modelo
+    # degradado volte a ser usado depois que o problema passa
+    "window_seconds": 300,
+    # Abaixo disso não há dados suficientes para considerar um modelo degradado
+    "min_samples": 10,
+    "max_error_rate": 0.2,
+    # Quando todos os modelos estão degradados, pedimos respostas mais curtas
+    "degraded_max_tokens_factor": 0.75,
+    "endpoints": {
+        # latency_slo_ms também é o prazo total da requisição: as tentativas
+        # (incluindo o fallback) dividem esse tempo, mesmo se um modelo travar
+        "summary": {
+            "models": ["gpt-3.5-turbo", "gpt-4.1-mini"],
+            "max_tokens": 200,
+            "latency_slo_ms": 4000
+        },
+        "summary_full": {
+            "models": ["gpt-4.1-mini", "gpt-3.5-turbo"],
+            "max_tokens": 250,
+            "latency_slo_ms": 5000
+        },
+        "analysis": {
+            "models": ["gpt-3.5-turbo", "gpt-4.1-mini"],
+            "max_tokens": 250,
+            "latency_slo_ms": 5000
+        }
+    },
+    # Prompts grandes vão primeiro para modelos que lidam melhor com mais contexto
+    "large_payload": {
+        "min_chars": 4000,
+        "models": ["gpt-4.1-mini"],
+        "extra_max_tokens": 50
+    },
+    "tiers": {
+        "free": {"models": [], "max_tokens_factor": 1.0},
+        "premium": {"models": ["gpt-4.1-mini"], "max_tokens_factor": 1.5}
+    },
+    "default_tier": "free"
+}
+
+
+def load_policy():
+    """Carregar a política padrão mesclada com MODEL_ROUTER_POLICY, se existir"""
+    policy = json.loads(json.dumps(DEFAULT_POLICY))
+
+    raw = os.environ.get('MODEL_ROUTER_POLICY')
+    if not raw:
+        return policy
+
+    try:
+        override = json.loads(raw)
+    except ValueError as e:
+        logger.error("Invalid MODEL_ROUTER_POLICY, using defaults: %s", e)
+        return policy
+
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(policy.get(key), dict):
+            for name, entry in value.items():
+                if isinstance(entry, dict) and isinstance(policy[key].get(name), dict):
+                    policy[key][name].update(entry)
+                else:
+                    policy[key][name] = entry
+        else:
+            policy[key] = value
+    return policy
+
+
+class ModelStats:
+    """Janela deslizante de latência e erros das chamadas de um modelo"""
+
+    def __init__(self, window_size, window_seconds):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms, ok):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency_ms, ok))
+
+    def snapshot(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            samples = [(latency, ok) for recorded_at, latency, ok in self._samples if recorded_at >= cutoff]
+
+        if not samples:
+            return {"samples": 0, "p95_latency_ms": None, "error_rate": 0.0}
+
+        latencies = sorted(latency for latency, _ in samples)
+        p95_index = min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "p95_latency_ms": round(latencies[p95_index], 1),
+            "error_rate": round(errors / len(samples), 3)
+        }
+
+
+class ModelRouter:
+    def __init__(self, policy=None):
+        self.policy = policy or load_policy()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _stats_for(self, model):
+        with self._lock:
+            if model not in self._stats:
+                self._stats[model] = ModelStats(self.policy["window_size"], self.policy["window_seconds"])
+            return self._stats[model]
+
+    def is_degraded(self, model, endpoint_policy):
+        stats = self._stats_for(model).snapshot()
+        if stats["samples"] < self.policy["min_samples"]:
+            return False
+        return (stats["p95_latency_ms"] > endpoint_policy["latency_slo_ms"]
+                or stats["error_rate"] > self.policy["max_error_rate"])
+
+    def route(self, endpoint, payload_size=0, user_tier=None):
+        """
+        Escolher a ordem de modelos e o max_tokens para uma requisição.
+        user_tier deve vir dos dados do usuário no servidor, nunca da requisição.
+        """
+        endpoint_policy = self.policy["endpoints"][endpoint]
+        tier = user_tier if user_tier in self.policy["tiers"] else self.policy["default_tier"]
+        tier_policy = self.policy["tiers"][tier]
+        large_policy = self.policy["large_payload"]
+        is_large = payload_size >= large_policy["min_chars"]
+
+        # Preferências (payload grande, tier) vêm antes da ordem do endpoint
+        preferred = list(tier_policy.get("models", []))
+        if is_large:
+            preferred = list(large_policy["models"]) + preferred
+
+        candidates = []
+        for model in preferred + list(endpoint_policy["models"]):
+            if model not in candidates:
+                candidates.append(model)
+
+        # Modelos degradados vão para o fim, mas continuam disponíveis como fallback
+        degraded = [model for model in candidates if self.is_degraded(model, endpoint_policy)]
+        candidates = [m for m in candidates if m not in degraded] + degraded
+
+        max_tokens = endpoint_policy["max_tokens"] * tier_policy.get("max_tokens_factor", 1.0)
+        if is_large:
+            max_tokens += large_policy["extra_max_tokens"]
+        if len(degraded) == len(candidates):
+            max_tokens *= self.policy["degraded_max_tokens_factor"]
+
+        return {
+            "endpoint": endpoint,
+            "tier": tier,
+            "payload_size": payload_size,
+            "models": candidates,
+            "degraded_models": degraded,
+            "max_tokens": int(max_tokens),
+            "timeout_s": endpoint_policy["latency_slo_ms"] / 1000.0
+        }
+
+    def complete(self, client, endpoint, messages, payload_size=0, user_tier=None, temperature=0.7):
+        """
+        Executar a completion com o modelo escolhido, caindo para o próximo em caso de falha.
+        Retorna (texto, metadados do roteamento).
+        """
+        decision = self.route(endpoint, payload_size, user_tier)
+        # O SLO vale para a requisição inteira: cada tentativa só recebe o tempo que sobrou
+        deadline = time.monotonic() + decision["timeout_s"]
+        attempts = []
+        last_error = None
+
+        for model in decision["models"]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Latency budget exhausted for %s after %d attempts", endpoint, len(attempts))
+                break
+
+            # Sem retries internos do cliente: quem faz o fallback é o roteador
+            attempt_client = client.with_options(timeout=remaining, max_retries=0)
+            started = time.perf_counter()
+            try:
+                response = attempt_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=decision["max_tokens"],
+                    temperature=temperature
+                )
+                content = response.choices[0].message.content.strip()
+            except Exception as e:
+                latency_ms = (time.perf_counter() - started) * 1000
+                self._stats_for(model).record(latency_ms, False)
+                attempts.append({"model": model, "error": str(e), "latency_ms": round(latency_ms, 1)})
+                logger.warning("Model %s failed for %s, trying fallback: %s", model, endpoint, e)
+                last_error = e
+                continue
+
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._stats_for(model).record(latency_ms, True)
+            attempts.append({"model": model, "latency_ms": round(latency_ms, 1)})
+
+            return content, {
+                "model": model,
+                "max_tokens": decision["max_tokens"],
+                "endpoint": endpoint,
+                "tier": decision["tier"],
+                "fallback_used": len(attempts) > 1,
+                "degraded_models": decision["degraded_models"],
+                "attempts": attempts
+            }
+
+        if last_error is None:
+            if decision["models"]:
+                raise TimeoutError(f"Latency budget exhausted for endpoint {endpoint}")
+            raise ValueError(f"No models configured for endpoint {endpoint}")
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            models = list(self._stats)
+        return {model: self._stats_for(model).snapshot() for model in models}
+
+
+# Instância global do roteador
+model_router = ModelRouter()
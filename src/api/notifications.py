@@ -3,9 +3,11 @@ import json
 from flask import Flask, request, jsonify
 import logging
 import requests
+from src.api.delivery_status import delivery_status_store, create_delivery_status_routes
+from src.api.message_builder import build_message
+from src.api.logging_setup import SUCCESS_LOG, TruncatedBody, configure_logging
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# O logging (fila + thread em segundo plano) é configurado por configure_logging()
 logger = logging.getLogger(__name__)
 
 class NotificationService:
@@ -15,6 +17,8 @@ class NotificationService:
         self.twilio_auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
         self.twilio_phone_number = os.environ.get('TWILIO_PHONE_NUMBER', '+14155238886')
         self.whatsapp_sandbox_number = os.environ.get('WHATSAPP_SANDBOX_NUMBER', 'whatsapp:+14155238886')
+        # URL pública de /api/webhooks/twilio/status para receber o status final das mensagens
+        self.twilio_status_callback_url = os.environ.get('TWILIO_STATUS_CALLBACK_URL')
         
         # Configurações SendGrid
         self.sendgrid_api_key = os.environ.get('SENDGRID_API_KEY')
@@ -24,7 +28,17 @@ class NotificationService:
         self.twilio_messages_url = f"https://api.twilio.com/2010-04-01/Accounts/{self.twilio_account_sid}/Messages.json"
         self.sendgrid_url = "https://api.sendgrid.com/v3/mail/send"
     
-    def send_sms(self, to_phone, message):
+    def _twilio_message_data(self, from_number, to_phone, message):
+        data = {
+            'From': from_number,
+            'To': to_phone,
+            'Body': message
+        }
+        if self.twilio_status_callback_url:
+            data['StatusCallback'] = self.twilio_status_callback_url
+        return data
+
+    def send_sms(self, to_phone, message, user_id=None):
         """Enviar SMS usando Twilio API diretamente"""
         if not self.twilio_account_sid or not self.twilio_auth_token:
             return {"success": False, "error": "Twilio not configured"}
@@ -34,11 +48,7 @@ class NotificationService:
             if not to_phone.startswith('+'):
                 to_phone = '+' + to_phone
             
-            data = {
-                'From': self.twilio_phone_number,
-                'To': to_phone,
-                'Body': message
-            }
+            data = self._twilio_message_data(self.twilio_phone_number, to_phone, message)
             
             response = requests.post(
                 self.twilio_messages_url,
@@ -48,21 +58,22 @@ class NotificationService:
             
             if response.status_code == 201:
                 result = response.json()
-                logger.info(f"SMS sent successfully. SID: {result.get('sid')}")
+                logger.info("SMS sent successfully. SID: %s", result.get('sid'), extra=SUCCESS_LOG)
+                delivery_status_store.register_message(result.get('sid'), user_id, 'sms', result.get('status'))
                 return {
                     "success": True, 
                     "message_sid": result.get('sid'),
                     "status": result.get('status')
                 }
             else:
-                logger.error(f"Error sending SMS: {response.text}")
+                logger.error("Error sending SMS: %s", TruncatedBody(response))
                 return {"success": False, "error": response.text}
             
         except Exception as e:
-            logger.error(f"Error sending SMS: {str(e)}")
+            logger.error("Error sending SMS: %s", e)
             return {"success": False, "error": str(e)}
     
-    def send_whatsapp(self, to_phone, message):
+    def send_whatsapp(self, to_phone, message, user_id=None):
         """Enviar mensagem WhatsApp usando Twilio API diretamente"""
         if not self.twilio_account_sid or not self.twilio_auth_token:
             return {"success": False, "error": "Twilio not configured"}
@@ -74,11 +85,7 @@ class NotificationService:
                     to_phone = '+' + to_phone
                 to_phone = 'whatsapp:' + to_phone
             
-            data = {
-                'From': self.whatsapp_sandbox_number,
-                'To': to_phone,
-                'Body': message
-            }
+            data = self._twilio_message_data(self.whatsapp_sandbox_number, to_phone, message)
             
             response = requests.post(
                 self.twilio_messages_url,
@@ -88,21 +95,22 @@ class NotificationService:
             
             if response.status_code == 201:
                 result = response.json()
-                logger.info(f"WhatsApp message sent successfully. SID: {result.get('sid')}")
+                logger.info("WhatsApp message sent successfully. SID: %s", result.get('sid'), extra=SUCCESS_LOG)
+                delivery_status_store.register_message(result.get('sid'), user_id, 'whatsapp', result.get('status'))
                 return {
                     "success": True, 
                     "message_sid": result.get('sid'),
                     "status": result.get('status')
                 }
             else:
-                logger.error(f"Error sending WhatsApp: {response.text}")
+                logger.error("Error sending WhatsApp: %s", TruncatedBody(response))
                 return {"success": False, "error": response.text}
             
         except Exception as e:
-            logger.error(f"Error sending WhatsApp: {str(e)}")
+            logger.error("Error sending WhatsApp: %s", e)
             return {"success": False, "error": str(e)}
     
-    def send_email(self, to_email, subject, html_content, text_content=None):
+    def send_email(self, to_email, subject, html_content, text_content=None, user_id=None):
         """Enviar email usando SendGrid API diretamente"""
         if not self.sendgrid_api_key:
             return {"success": False, "error": "SendGrid not configured"}
@@ -129,6 +137,10 @@ class NotificationService:
                 ]
             }
             
+            # Devolvido pelo SendGrid Event Webhook em cada evento
+            if user_id:
+                data["custom_args"] = {"user_id": str(user_id)}
+            
             if text_content:
                 data["content"].append({
                     "type": "text/plain",
@@ -142,18 +154,20 @@ class NotificationService:
             )
             
             if response.status_code == 202:
-                logger.info(f"Email sent successfully. Status: {response.status_code}")
+                logger.info("Email sent successfully. Status: %s", response.status_code, extra=SUCCESS_LOG)
+                message_id = response.headers.get('X-Message-Id')
+                delivery_status_store.register_message(message_id, user_id, 'email')
                 return {
                     "success": True,
                     "status_code": response.status_code,
-                    "message_id": response.headers.get('X-Message-Id')
+                    "message_id": message_id
                 }
             else:
-                logger.error(f"Error sending email: {response.text}")
+                logger.error("Error sending email: %s", TruncatedBody(response))
                 return {"success": False, "error": response.text}
             
         except Exception as e:
-            logger.error(f"Error sending email: {str(e)}")
+            logger.error("Error sending email: %s", e)
             return {"success": False, "error": str(e)}
     
     def send_wellness_summary(self, user_data, summary_text, channels=['email']):
@@ -164,9 +178,21 @@ class NotificationService:
         
         # Preparar conteúdo personalizado
         user_name = user_data.get('name', 'Usuário')
+        # Chave do histórico de entregas (/api/delivery-status/<user_id>). Só um id real do
+        # usuário: email e telefone são dados pessoais e não podem aparecer na URL
+        user_id = str(user_data['id']) if user_data.get('id') else None
         
-        # Conteúdo para SMS/WhatsApp (mais curto)
-        short_message = f"🌟 Olá {user_name}!\n\n{summary_text[:200]}...\n\nVeja o relatório completo no app!"
+        # Conteúdo para SMS/WhatsApp (mais curto), cortado em palavra para caber
+        # no orçamento de segmentos de cada canal (SMS sem emoji, em GSM-7)
+        short_messages = {
+            channel: build_message(
+                channel,
+                summary_text,
+                prefix=f"🌟 Olá {user_name}!\n\n",
+                suffix="\n\nVeja o relatório completo no app!"
+            )
+            for channel in ('sms', 'whatsapp') if channel in channels
+        }
         
         # Conteúdo para email (mais detalhado)
         email_subject = f"Seu Relatório Diário de Wellness - {user_name}"
@@ -199,19 +225,24 @@ class NotificationService:
         </html>
         """
         
-        # Enviar por cada canal solicitado
-        if 'sms' in channels and user_data.get('phone'):
-            results['sms'] = self.send_sms(user_data['phone'], short_message)
-        
-        if 'whatsapp' in channels and user_data.get('phone'):
-            results['whatsapp'] = self.send_whatsapp(user_data['phone'], short_message)
+        # Enviar por cada canal solicitado (nunca acima do orçamento de segmentos)
+        senders = {'sms': self.send_sms, 'whatsapp': self.send_whatsapp}
+        for channel, built in short_messages.items():
+            if not user_data.get('phone'):
+                continue
+            if built['over_budget']:
+                results[channel] = {"success": False, "error": "Message exceeds segment budget"}
+            else:
+                results[channel] = senders[channel](user_data['phone'], built['text'], user_id)
+            results[channel]['segments'] = built['segments']
         
         if 'email' in channels and user_data.get('email'):
             results['email'] = self.send_email(
                 user_data['email'], 
                 email_subject, 
                 email_html,
-                summary_text
+                summary_text,
+                user_id
             )
         
         return results
@@ -223,8 +254,8 @@ class NotificationService:
         results = {}
         
         if test_data.get('phone'):
-            results['sms'] = self.send_sms(test_data['phone'], test_message)
-            results['whatsapp'] = self.send_whatsapp(test_data['phone'], test_message)
+            results['sms'] = self.send_sms(test_data['phone'], build_message('sms', test_message)['text'])
+            results['whatsapp'] = self.send_whatsapp(test_data['phone'], build_message('whatsapp', test_message)['text'])
         
         if test_data.get('email'):
             results['email'] = self.send_email(
@@ -242,6 +273,9 @@ notification_service = NotificationService()
 def create_notification_routes(app):
     """Criar rotas para o sistema de notificações"""
     
+    # Webhooks de status de entrega (Twilio/SendGrid) e histórico por usuário
+    create_delivery_status_routes(app)
+    
     @app.route('/api/send-wellness-summary', methods=['POST'])
     def send_wellness_summary():
         try:
@@ -267,7 +301,7 @@ def create_notification_routes(app):
             })
             
         except Exception as e:
-            logger.error(f"Error in send_wellness_summary: {str(e)}")
+            logger.error("Error in send_wellness_summary: %s", e)
             return jsonify({"error": str(e)}), 500
     
     @app.route('/api/test-notifications', methods=['POST'])
@@ -291,7 +325,7 @@ def create_notification_routes(app):
             })
             
         except Exception as e:
-            logger.error(f"Error in test_notifications: {str(e)}")
+            logger.error("Error in test_notifications: %s", e)
             return jsonify({"error": str(e)}), 500
     
     @app.route('/api/notification-status', methods=['GET'])
@@ -312,7 +346,9 @@ def create_notification_routes(app):
         return jsonify(status)
 
 if __name__ == "__main__":
-    # Teste local
+    # Teste local, a partir da raiz do projeto: python -m src.api.notifications
+    # (no deploy as rotas são registradas em src/api/index.py)
+    configure_logging()
     app = Flask(__name__)
     create_notification_routes(app)
     app.run(debug=True, port=5002)
@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import hmac
+import json
+from types import SimpleNamespace
+
+import pytest
+from ellipticcurve.ecdsa import Ecdsa
+from ellipticcurve.privateKey import PrivateKey
+from flask import Flask
+
+from src.api import delivery_status
+from src.api.delivery_status import DeliveryStatusStore, create_delivery_status_routes, parse_sendgrid_events
+
+TWILIO_URL = 'http://localhost/api/webhooks/twilio/status'
+SENDGRID_KEY = PrivateKey()
+
+
+def twilio_signature(params, token='secret'):
+    data = TWILIO_URL + ''.join(key + params[key] for key in sorted(params))
+    return base64.b64encode(hmac.new(token.encode(), data.encode(), hashlib.sha1).digest()).decode()
+
+
+def sendgrid_headers(body, timestamp='1700000000'):
+    signature = Ecdsa.sign(timestamp + body, SENDGRID_KEY).toBase64()
+    return {
+        'Content-Type': 'application/json',
+        'X-Twilio-Email-Event-Webhook-Signature': signature,
+        'X-Twilio-Email-Event-Webhook-Timestamp': timestamp
+    }
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = DeliveryStatusStore()
+    monkeypatch.setattr(delivery_status, 'delivery_status_store', store)
+    monkeypatch.setattr(delivery_status, 'delivery_event_buffer', delivery_status.DeliveryEventBuffer(store))
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN', 'secret')
+    public_pem = SENDGRID_KEY.publicKey().toPem()
+    monkeypatch.setenv('SENDGRID_WEBHOOK_PUBLIC_KEY', ''.join(
+        line for line in public_pem.splitlines() if line and '-----' not in line))
+    return store
+
+
+@pytest.fixture
+def client(store):
+    app = Flask(__name__)
+    create_delivery_status_routes(app)
+    return app.test_client()
+
+
+def test_twilio_callback_requires_valid_signature(client, store):
+    params = {'MessageSid': 'SM1', 'MessageStatus': 'delivered', 'To': '+5511999999999'}
+
+    assert client.post('/api/webhooks/twilio/status', data=params).status_code == 403
+    forged = client.post('/api/webhooks/twilio/status', data=params,
+                         headers={'X-Twilio-Signature': twilio_signature(params, 'wrong')})
+    assert forged.status_code == 403
+
+    response = client.post('/api/webhooks/twilio/status', data=params,
+                           headers={'X-Twilio-Signature': twilio_signature(params)})
+    assert response.status_code == 204
+    delivery_status.delivery_event_buffer.flush()
+    assert store.get_message('SM1')['status'] == 'delivered'
+
+
+def test_sendgrid_webhook_requires_valid_signature(client):
+    body = json.dumps([{'event': 'delivered', 'sg_message_id': 'abc.filter1'}])
+    assert client.post('/api/webhooks/sendgrid/events', data=body,
+                       content_type='application/json').status_code == 403
+
+    headers = sendgrid_headers(body)
+    headers['X-Twilio-Email-Event-Webhook-Timestamp'] = '1700000001'
+    assert client.post('/api/webhooks/sendgrid/events', data=body, headers=headers).status_code == 403
+
+    assert client.post('/api/webhooks/sendgrid/events', data=body,
+                       headers=sendgrid_headers(body)).status_code == 204
+
+
+def test_sendgrid_malformed_items_are_skipped(client):
+    body = json.dumps([1, 2, None, {'event': 'delivered', 'sg_message_id': 42},
+                       {'event': ['x'], 'sg_message_id': 'a'}, {'event': 'delivered', 'sg_message_id': 'ok.1'}])
+    response = client.post('/api/webhooks/sendgrid/events', data=body, headers=sendgrid_headers(body))
+    assert response.status_code == 204
+    assert delivery_status.delivery_event_buffer.pending() == 1
+
+
+def test_webhook_cannot_take_over_registered_message(client, store):
+    store.register_message('abc', 'alice', 'email')
+    body = json.dumps([{'event': 'delivered', 'sg_message_id': 'abc.filter1', 'user_id': 'mallory'}])
+    client.post('/api/webhooks/sendgrid/events', data=body, headers=sendgrid_headers(body))
+    delivery_status.delivery_event_buffer.flush()
+
+    alice = client.get('/api/delivery-status/alice').json['messages']
+    assert [(m['message_id'], m['status']) for m in alice] == [('abc', 'delivered')]
+    assert client.get('/api/delivery-status/mallory').json['messages'] == []
+
+
+def test_history_does_not_flush_buffer(client, store):
+    store.register_message('SM2', 'bob', 'sms')
+    delivery_status.delivery_event_buffer._events.append(
+        {'message_id': 'SM2', 'channel': 'sms', 'status': 'delivered', 'timestamp': 't'})
+
+    client.get('/api/delivery-status/bob')
+    assert delivery_status.delivery_event_buffer.pending() == 1
+
+
+def test_store_bounds_messages_and_events():
+    store = DeliveryStatusStore(max_messages=3, events_per_message=2)
+    for i in range(5):
+        store.register_message(f'SM{i}', 'carol', 'sms')
+    store.write_batch([{'message_id': 'SM4', 'channel': 'sms', 'status': 'sent', 'timestamp': str(i)}
+                       for i in range(10)])
+
+    assert store.get_message('SM0') is None
+    assert len(store.get_message('SM4')['events']) == 2
+    assert [m['message_id'] for m in store.history('carol')] == ['SM4', 'SM3', 'SM2']
+
+
+def test_parse_sendgrid_events_normalizes_message_id():
+    events = parse_sendgrid_events([{'event': 'bounce', 'sg_message_id': 'xyz.filter', 'reason': 'no mailbox'}])
+    assert events[0]['message_id'] == 'xyz'
+    assert events[0]['status'] == 'bounced'
+    assert events[0]['error'] == 'no mailbox'
+
+
+def test_routes_are_mounted_in_deployed_app(store):
+    import src.api.index as index
+
+    client = index.app.test_client()
+    params = {'MessageSid': 'SM9', 'MessageStatus': 'sent', 'To': '+5511999999999'}
+    store.register_message('SM9', 'user-9', 'sms')
+
+    response = client.post('/api/webhooks/twilio/status', data=params,
+                           headers={'X-Twilio-Signature': twilio_signature(params)})
+    assert response.status_code == 204
+    delivery_status.delivery_event_buffer.flush()
+
+    history = client.get('/api/delivery-status/user-9')
+    assert history.status_code == 200
+    assert history.json['messages'][0]['status'] == 'sent'
+    assert client.post('/api/webhooks/sendgrid/events', json=[]).status_code == 403
+
+
+def test_history_is_never_keyed_by_email_or_phone(store, monkeypatch):
+    from src.api import notifications
+
+    sent = []
+
+    def fake_post(url, headers=None, json=None):
+        sent.append(json)
+        return SimpleNamespace(status_code=202, headers={'X-Message-Id': f'msg{len(sent)}'})
+
+    monkeypatch.setattr(notifications, 'delivery_status_store', store)
+    monkeypatch.setattr(notifications.requests, 'post', fake_post)
+    service = notifications.NotificationService()
+    service.sendgrid_api_key = 'key'
+
+    service.send_wellness_summary({'email': 'ana@example.com'}, 'Resumo', ['email'])
+    service.send_wellness_summary({'id': 42, 'email': 'ana@example.com'}, 'Resumo', ['email'])
+
+    assert 'custom_args' not in sent[0]
+    assert store.get_message('msg1')['user_id'] is None
+    assert store.history('ana@example.com') == []
+    assert sent[1]['custom_args'] == {'user_id': '42'}
+    assert [message['message_id'] for message in store.history('42')] == ['msg2']
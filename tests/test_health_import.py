@@ -0,0 +1,208 @@
+import io
+import time
+import zipfile
+
+import pytest
+from flask import Flask
+
+from src.api import health_import
+from src.api.health_import import (HealthHistoryStore, ImportJobRegistry, UploadTooLarge, _copy_limited,
+                                   create_health_import_routes, import_export_file, parse_export)
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="pt_BR">\n <ExportDate value="2025-09-22 08:00:00 -0300"/>\n'
+FOOTER = '</HealthData>\n'
+
+
+def record(record_type, value, unit='count', source='iPhone', start='2025-09-20 10:00:00 -0300',
+           end='2025-09-20 10:09:00 -0300', metadata=False):
+    attrs = (f'type="{record_type}" sourceName="{source}" unit="{unit}" '
+             f'startDate="{start}" endDate="{end}" value="{value}"')
+    if not metadata:
+        return f' <Record {attrs}/>\n'
+    return (f' <Record {attrs}>\n'
+            '  <MetadataEntry key="HKWasUserEntered" value="0"/>\n'
+            '  <MetadataEntry key="HKMetadataKeySyncVersion" value="2"/>\n'
+            ' </Record>\n')
+
+
+def export_xml(*records):
+    return (HEADER + ''.join(records) + FOOTER).encode('utf-8')
+
+
+SAMPLE = export_xml(
+    record('HKQuantityTypeIdentifierStepCount', 1000, source='iPhone', metadata=True),
+    record('HKQuantityTypeIdentifierStepCount', 500, source='iPhone'),
+    record('HKQuantityTypeIdentifierStepCount', 1200, source='Apple Watch', metadata=True),
+    record('HKQuantityTypeIdentifierStepCount', 300, start='2025-09-21 09:00:00 -0300'),
+    record('HKCategoryTypeIdentifierSleepAnalysis', 'HKCategoryValueSleepAnalysisAsleepDeep',
+           unit='', source='Apple Watch', start='2025-09-20 23:30:00 -0300', end='2025-09-21 01:00:00 -0300'),
+    record('HKCategoryTypeIdentifierSleepAnalysis', 'HKCategoryValueSleepAnalysisAsleepREM',
+           unit='', source='Apple Watch', start='2025-09-21 01:00:00 -0300', end='2025-09-21 01:45:00 -0300'),
+    record('HKCategoryTypeIdentifierSleepAnalysis', 'HKCategoryValueSleepAnalysisAwake',
+           unit='', source='Apple Watch', start='2025-09-21 01:45:00 -0300', end='2025-09-21 02:00:00 -0300'),
+)
+
+
+def by_day(daily_metrics):
+    return {day['reportDate']: day for day in daily_metrics}
+
+
+def test_largest_source_per_day_is_used():
+    days = by_day(parse_export(io.BytesIO(SAMPLE)))
+
+    # iPhone soma 1500 e o Apple Watch 1200: vence a fonte com o maior total do dia
+    assert days['2025-09-20']['activity']['stepCount'] == 1500
+    assert days['2025-09-21']['activity']['stepCount'] == 300
+
+
+def test_sleep_counts_for_the_day_it_ends():
+    days = by_day(parse_export(io.BytesIO(SAMPLE)))
+
+    assert 'sleep' not in days['2025-09-20']
+    assert days['2025-09-21']['sleep'] == {
+        'totalDuration': 135,
+        'deepSleepDuration': 90,
+        'remSleepDuration': 45
+    }
+
+
+def test_units_are_converted():
+    data = export_xml(
+        record('HKQuantityTypeIdentifierActiveEnergyBurned', 418.4, unit='kJ'),
+        record('HKQuantityTypeIdentifierDistanceWalkingRunning', 2, unit='mi'),
+        record('HKQuantityTypeIdentifierDistanceWalkingRunning', 1500, unit='m', start='2025-09-21 10:00:00 -0300'),
+    )
+    days = by_day(parse_export(io.BytesIO(data)))
+
+    assert days['2025-09-20']['activity'] == {'activeEnergyBurned': 100, 'distanceWalkingRunning': 3.22}
+    assert days['2025-09-21']['activity'] == {'distanceWalkingRunning': 1.5}
+
+
+def test_records_with_metadata_children_survive_root_clearing():
+    # root.clear() roda no fim de cada MetadataEntry, enquanto o <Record> pai ainda está aberto
+    records = [record('HKQuantityTypeIdentifierStepCount', 10, source=f'source-{i % 2}', metadata=True)
+               for i in range(200)]
+    progress = []
+
+    days = by_day(parse_export(io.BytesIO(export_xml(*records)), progress=progress.append, progress_every=50))
+
+    assert days['2025-09-20']['activity']['stepCount'] == 1000
+    assert [update['records_seen'] for update in progress] == [50, 100, 150, 200, 200]
+    assert progress[-1]['records_used'] == 200 and progress[-1]['done'] is True
+
+
+def test_zip_export_is_read(tmp_path):
+    path = tmp_path / 'export.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('apple_health_export/export_cda.xml', '<ClinicalDocument/>')
+        archive.writestr('apple_health_export/export.xml', SAMPLE)
+
+    store = HealthHistoryStore()
+    daily_metrics = import_export_file(str(path), 'history-1', store)
+
+    assert [day['reportDate'] for day in daily_metrics] == ['2025-09-20', '2025-09-21']
+    assert store.get('history-1', start='2025-09-21') == [daily_metrics[1]]
+
+
+def test_zip_without_export_fails(tmp_path):
+    path = tmp_path / 'export.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('apple_health_export/export_cda.xml', '<ClinicalDocument/>')
+
+    with pytest.raises(ValueError):
+        import_export_file(str(path), 'history-1', HealthHistoryStore())
+
+
+def test_copy_stops_at_size_limit():
+    with pytest.raises(UploadTooLarge):
+        _copy_limited(io.BytesIO(b'x' * 11), io.BytesIO(), 10)
+    assert _copy_limited(io.BytesIO(b'x' * 10), io.BytesIO(), 10) == 10
+
+
+@pytest.fixture
+def import_app(monkeypatch):
+    store = HealthHistoryStore()
+    jobs = ImportJobRegistry(max_running=2, job_ttl=60)
+    monkeypatch.setattr(health_import, 'health_history_store', store)
+    monkeypatch.setattr(health_import, 'import_jobs', jobs)
+
+    app = Flask(__name__)
+    create_health_import_routes(app)
+    return app.test_client(), jobs
+
+
+def wait_for_job(client, status_url):
+    for _ in range(200):
+        job = client.get(status_url).json
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("import job did not finish")
+
+
+def test_upload_job_and_history_flow(import_app):
+    client, _ = import_app
+
+    response = client.post('/api/health-history/import?user_id=someone-else',
+                           data={'file': (io.BytesIO(SAMPLE), 'export.xml'), 'user_id': 'someone-else'})
+    assert response.status_code == 202
+    job = response.json
+    # O histórico usa uma chave gerada no servidor, nunca o user_id enviado pelo cliente
+    assert job['history_id'] not in ('someone-else', None)
+    assert 'user_id' not in job
+
+    finished = wait_for_job(client, job['status_url'])
+    assert finished['status'] == 'completed'
+    assert finished['days_imported'] == 2
+
+    history = client.get(job['history_url']).json
+    assert [day['reportDate'] for day in history['days']] == ['2025-09-20', '2025-09-21']
+    assert client.get('/api/health-history/someone-else').json['days'] == []
+
+    raw = client.post('/api/health-history/import', data=SAMPLE, content_type='application/xml')
+    assert raw.status_code == 202
+    assert raw.json['history_id'] != job['history_id']
+
+
+def test_upload_rejected_when_too_many_jobs_running(import_app):
+    client, jobs = import_app
+    assert jobs.reserve() and jobs.reserve()
+
+    response = client.post('/api/health-history/import', data=SAMPLE, content_type='application/xml')
+    assert response.status_code == 429
+    assert response.headers['Retry-After']
+
+    jobs.release()
+    assert client.post('/api/health-history/import', data=SAMPLE,
+                       content_type='application/xml').status_code == 202
+
+
+def test_upload_rejected_when_too_large(import_app, monkeypatch):
+    client, jobs = import_app
+    monkeypatch.setattr(health_import, 'IMPORT_MAX_BYTES', len(SAMPLE) - 1)
+
+    response = client.post('/api/health-history/import', data=SAMPLE, content_type='application/xml')
+    assert response.status_code == 413
+    # A vaga não fica presa após a recusa
+    assert jobs.reserve() and jobs.reserve()
+
+
+def test_empty_upload_releases_slot(import_app):
+    client, jobs = import_app
+
+    assert client.post('/api/health-history/import', data=b'', content_type='application/xml').status_code == 400
+    assert jobs.reserve() and jobs.reserve()
+
+
+def test_finished_jobs_expire(import_app):
+    client, jobs = import_app
+    jobs.job_ttl = 0
+
+    job = client.post('/api/health-history/import', data=SAMPLE, content_type='application/xml').json
+    for _ in range(200):
+        if client.get(job['status_url']).status_code == 404:
+            break
+        time.sleep(0.01)
+
+    assert client.get(job['status_url']).status_code == 404
+    assert client.get(job['history_url']).json['days']
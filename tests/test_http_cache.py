@@ -0,0 +1,98 @@
+import gzip
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+import src.api.index as index
+from src.api.http_cache import validator_store
+
+
+class FakeOpenAI:
+    """Cliente falso que conta as chamadas de completion"""
+
+    calls = []
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=self)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, **kwargs):
+        FakeOpenAI.calls.append(kwargs)
+        message = SimpleNamespace(content="Ótimo dia! " * 200)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    FakeOpenAI.calls = []
+    validator_store.clear()
+    monkeypatch.setattr(openai, 'OpenAI', FakeOpenAI)
+    return index.app.test_client()
+
+
+def test_second_summary_request_returns_304_without_llm_call(client):
+    body = {"steps": 8000, "calories": 450, "sleep_hours": 7}
+
+    first = client.post('/api/generate-summary', json=body)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    second = client.post('/api/generate-summary', json=body, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    assert len(FakeOpenAI.calls) == 1
+
+
+def test_different_body_falls_through_to_200(client):
+    first = client.post('/api/generate-summary', json={"steps": 8000})
+    etag = first.headers['ETag']
+
+    other = client.post('/api/generate-summary', json={"steps": 9000}, headers={'If-None-Match': etag})
+    assert other.status_code == 200
+    assert len(FakeOpenAI.calls) == 2
+
+
+def test_wildcard_if_none_match_is_ignored_for_post(client):
+    response = client.post('/api/analysis/personalized', json={"steps": 1}, headers={'If-None-Match': '*'})
+    assert response.status_code == 200
+    assert response.json['analysis']
+
+
+def test_gzip_negotiation(client):
+    response = client.post('/api/generate-summary', json={"steps": 1}, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'].endswith('-gzip"')
+    assert b'summary' in gzip.decompress(response.data)
+
+    plain = client.post('/api/generate-summary', json={"steps": 1}, headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in plain.headers
+
+
+@pytest.mark.parametrize('method, path, cache_control', [
+    ('post', '/api/generate-summary', 'private, no-cache'),
+    ('post', '/api/analysis/personalized', 'private, no-cache'),
+    ('get', '/api/user/profile', 'private, max-age=60, must-revalidate'),
+])
+def test_cache_control_per_route(client, method, path, cache_control):
+    response = getattr(client, method)(path, json={"steps": 1} if method == 'post' else None)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == cache_control
+    assert response.headers['ETag']
+
+
+def test_profile_is_revalidated_against_fresh_body(client, monkeypatch):
+    first = client.get('/api/user/profile')
+    etag = first.headers['ETag']
+
+    assert client.get('/api/user/profile', headers={'If-None-Match': etag}).status_code == 304
+
+    # Perfil alterado: o ETag antigo não pode mais gerar 304
+    monkeypatch.setitem(index.app.view_functions, 'get_user_profile', lambda: {"name": "novo"})
+    changed = client.get('/api/user/profile', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
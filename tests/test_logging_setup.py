@@ -0,0 +1,133 @@
+import atexit
+import io
+import json
+import logging
+
+import pytest
+from flask import Flask
+
+from src.api import logging_setup
+from src.api.logging_setup import (LOG_BODY_LIMIT, SamplingFilter, TruncatedBody, configure_logging,
+                                   init_request_logging)
+
+
+@pytest.fixture
+def log_output(monkeypatch):
+    """Configura o logging com um stream próprio e restaura o root logger no fim"""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    monkeypatch.setattr(logging_setup, '_listener', None)
+
+    stream = io.StringIO()
+    listener = configure_logging(stream=stream)
+
+    def entries():
+        # stop() esvazia a fila antes de encerrar a thread do listener
+        listener.stop()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield entries
+
+    if listener._thread is not None:
+        listener.stop()
+    atexit.unregister(listener.stop)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    init_request_logging(app)
+
+    @app.route('/ping')
+    def ping():
+        logging.getLogger('tests.ping').info("pong %s", 1)
+        return 'ok'
+
+    return app
+
+
+def test_request_id_is_reused_and_echoed(app):
+    client = app.test_client()
+
+    response = client.get('/ping', headers={'X-Request-ID': 'abc123'})
+    assert response.headers['X-Request-ID'] == 'abc123'
+
+    generated = client.get('/ping').headers['X-Request-ID']
+    assert len(generated) == 32
+    assert generated != client.get('/ping').headers['X-Request-ID']
+
+
+def test_request_id_is_in_json_output(app, log_output):
+    app.test_client().get('/ping', headers={'X-Request-ID': 'abc123'})
+    logging.getLogger('tests.ping').info("outside request")
+
+    entries = [entry for entry in log_output() if entry['logger'] == 'tests.ping']
+    assert entries[0]['message'] == "pong 1"
+    assert entries[0]['level'] == "INFO"
+    assert entries[0]['request_id'] == 'abc123'
+    assert entries[1]['request_id'] is None
+
+
+def test_message_is_interpolated_on_the_calling_thread(log_output):
+    payload = {'status': 'queued'}
+    logging.getLogger('tests.mutation').info("payload %s", payload)
+    payload['status'] = 'changed'
+
+    assert log_output()[0]['message'] == "payload {'status': 'queued'}"
+
+
+def test_exceptions_are_rendered(log_output):
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger('tests.error').exception("failed")
+
+    entry = log_output()[0]
+    assert entry['message'] == "failed"
+    assert "ValueError: boom" in entry['exception']
+
+
+def test_sampling_drops_records_with_zero_rate(log_output):
+    logger = logging.getLogger('tests.sampling')
+    for _ in range(20):
+        logger.info("sampled", extra={'sample_rate': 0.0})
+    logger.info("kept")
+
+    assert [entry['message'] for entry in log_output()] == ["kept"]
+
+
+def test_sampling_filter_keeps_unmarked_records():
+    record = logging.LogRecord('tests', logging.INFO, __file__, 1, "msg", None, None)
+    assert SamplingFilter().filter(record) is True
+
+    record.sample_rate = 0.0
+    assert SamplingFilter().filter(record) is False
+
+
+def test_truncated_body_respects_limit():
+    short = 'a' * LOG_BODY_LIMIT
+    assert str(TruncatedBody(short)) == short
+
+    body = 'b' * (LOG_BODY_LIMIT + 25)
+    assert str(TruncatedBody(body)) == 'b' * LOG_BODY_LIMIT + "... (25 chars truncated)"
+
+
+def test_truncated_body_reads_response_text():
+    class Response:
+        text = 'x' * 12
+
+    assert str(TruncatedBody(Response(), limit=10)) == 'x' * 10 + "... (2 chars truncated)"
+
+
+def test_configure_logging_is_idempotent(log_output):
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    listener = logging_setup._listener
+
+    assert configure_logging(stream=io.StringIO()) is listener
+    assert root.handlers == handlers
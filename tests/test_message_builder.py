@@ -0,0 +1,88 @@
+import pytest
+
+from src.api.message_builder import (
+    CHANNEL_BUDGETS, TRUNCATION_MARK, build_message, count_segments, detect_encoding, transliterate_to_gsm7
+)
+
+SUMMARY = (
+    "Parabéns, você atingiu a meta de calorias hoje! Sua noite de sono foi ótima, com ação "
+    "restauradora e ênfase no sono profundo. Amanhã, que tal uma caminhada após o almoço? "
+    "Não desanime: a constância é o segredo da evolução. Você está indo muito bem, continue "
+    "assim, cada passo conta! 💪"
+)
+
+
+@pytest.mark.parametrize('text, encoding, length, segments', [
+    ("a" * 160, 'GSM-7', 160, 1),
+    ("a" * 161, 'GSM-7', 161, 2),
+    ("ã" * 70, 'UCS-2', 70, 1),
+    ("ã" * 71, 'UCS-2', 71, 2),
+    ("€" * 80, 'GSM-7', 160, 1),
+    ("€" * 81, 'GSM-7', 162, 2),
+    ("é" * 160, 'GSM-7', 160, 1),
+])
+def test_count_segments(text, encoding, length, segments):
+    assert detect_encoding(text) == encoding
+    assert count_segments(text) == {"encoding": encoding, "length": length, "segments": segments}
+
+
+def test_extension_character_is_not_split_between_segments():
+    # 152 septetos + "€" (2) não cabe nos 153 do primeiro segmento
+    assert count_segments("a" * 152 + "€" + "a" * 152)["segments"] == 3
+
+
+def test_emoji_surrogate_pair_is_not_split_at_67_unit_boundary():
+    # 66 unidades + emoji (2) não cabe nos 67 do primeiro segmento
+    info = count_segments("ã" * 66 + "😀" + "ã" * 66)
+    assert info == {"encoding": 'UCS-2', "length": 134, "segments": 3}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("ação", "acao"),
+    ("você", "voce"),
+    ("Olá", "Ola"),
+    ("Conceição, maçã e pão", "Conceicao, maca e pao"),
+    ("é É à Ç", "é É à Ç"),
+    ("🌟 Olá!", "Ola!"),
+    ("“ótimo” – às vezes…", '"otimo" - às vezes...'),
+])
+def test_transliterate_portuguese(text, expected):
+    result = transliterate_to_gsm7(text)
+    assert result == expected
+    assert detect_encoding(result) == 'GSM-7'
+
+
+def test_sms_summary_fits_budget_and_ends_at_word_boundary():
+    message = build_message('sms', SUMMARY * 3, prefix="🌟 Olá Conceição!\n\n")
+
+    assert message["segments"] <= CHANNEL_BUDGETS['sms']['max_segments']
+    assert message["encoding"] == 'GSM-7'
+    assert message["truncated"] and message["transliterated"]
+    assert not message["over_budget"]
+    assert message["text"].startswith("Ola Conceicao!\n\n")
+    assert message["text"].endswith(TRUNCATION_MARK)
+
+    words = transliterate_to_gsm7(SUMMARY * 3).split()
+    last_word = message["text"][:-len(TRUNCATION_MARK)].split()[-1]
+    assert last_word.rstrip(',;:') in words
+
+
+def test_whatsapp_keeps_accents_and_emoji():
+    message = build_message('whatsapp', "Você dormiu ótimo! 💪")
+    assert message["text"] == "Você dormiu ótimo! 💪"
+    assert message["encoding"] == 'UCS-2'
+    assert not message["truncated"]
+
+
+def test_oversized_prefix_still_fits_budget():
+    message = build_message('sms', 'x' * 50, prefix='a' * 400)
+    assert message["segments"] <= CHANNEL_BUDGETS['sms']['max_segments']
+    assert message["truncated"]
+    assert not message["over_budget"]
+
+
+def test_impossible_budget_is_flagged(monkeypatch):
+    monkeypatch.setitem(CHANNEL_BUDGETS, 'sms', {'max_segments': 0, 'transliterate': True})
+    message = build_message('sms', 'Olá', prefix='Oi ', suffix='!')
+    assert message["over_budget"] is True
+    assert message["segments"] == 0
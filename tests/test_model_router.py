@@ -0,0 +1,192 @@
+import json
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+import src.api.index as index
+import src.api.model_router as model_router_module
+from src.api.http_cache import validator_store
+from src.api.model_router import ModelRouter, load_policy
+
+
+class FakeClient:
+    """Cliente falso: modelos em `failing` levantam erro; registra opções e chamadas"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.options = []
+        self.calls = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def with_options(self, **kwargs):
+        self.options.append(kwargs)
+        return self
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs['model'] in self.failing:
+            raise TimeoutError("timed out")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" ok "))])
+
+
+class FakeClock:
+    """Relógio monotônico controlado pelo teste"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+def test_attempts_are_bounded_by_latency_slo(monkeypatch):
+    monkeypatch.setattr(model_router_module, 'time', FakeClock())
+    client = FakeClient()
+    ModelRouter().complete(client, "summary", messages=[])
+    assert client.options == [{"timeout": 4.0, "max_retries": 0}]
+
+
+def test_fallback_only_gets_the_remaining_budget(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(model_router_module, 'time', clock)
+
+    class SlowClient(FakeClient):
+        def create(self, **kwargs):
+            clock.now += 3.0
+            return super().create(**kwargs)
+
+    client = SlowClient(failing={"gpt-3.5-turbo"})
+    ModelRouter().complete(client, "summary", messages=[])
+
+    assert [options["timeout"] for options in client.options] == [4.0, 1.0]
+
+
+def test_stops_when_latency_budget_is_exhausted(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(model_router_module, 'time', clock)
+
+    class HangingClient(FakeClient):
+        def create(self, **kwargs):
+            clock.now += 4.0
+            return super().create(**kwargs)
+
+    client = HangingClient(failing={"gpt-3.5-turbo"})
+    with pytest.raises(TimeoutError):
+        ModelRouter().complete(client, "summary", messages=[])
+
+    assert [call["model"] for call in client.calls] == ["gpt-3.5-turbo"]
+
+
+def _record(router, model, count, latency_ms=100, ok=True):
+    for _ in range(count):
+        router._stats_for(model).record(latency_ms, ok)
+
+
+def test_slow_model_moves_behind_healthy_models():
+    router = ModelRouter()
+    _record(router, "gpt-3.5-turbo", 10, latency_ms=4500)
+
+    decision = router.route("summary")
+
+    assert decision["models"] == ["gpt-4.1-mini", "gpt-3.5-turbo"]
+    assert decision["degraded_models"] == ["gpt-3.5-turbo"]
+    assert decision["max_tokens"] == 200
+
+
+def test_failing_model_moves_behind_healthy_models():
+    router = ModelRouter()
+    _record(router, "gpt-3.5-turbo", 7)
+    _record(router, "gpt-3.5-turbo", 3, ok=False)
+
+    assert router.route("summary")["models"] == ["gpt-4.1-mini", "gpt-3.5-turbo"]
+
+
+def test_model_is_not_degraded_before_min_samples():
+    router = ModelRouter()
+    _record(router, "gpt-3.5-turbo", 9, ok=False)
+
+    assert router.route("summary")["degraded_models"] == []
+
+
+def test_max_tokens_shrink_when_every_model_is_degraded():
+    router = ModelRouter()
+    _record(router, "gpt-3.5-turbo", 10, ok=False)
+    _record(router, "gpt-4.1-mini", 10, latency_ms=9000)
+
+    decision = router.route("summary")
+
+    assert decision["models"] == ["gpt-3.5-turbo", "gpt-4.1-mini"]
+    assert decision["max_tokens"] == int(200 * 0.75)
+
+
+def test_large_payload_prefers_large_context_models():
+    router = ModelRouter()
+
+    small = router.route("summary", payload_size=3999)
+    large = router.route("summary", payload_size=4000)
+
+    assert small["models"] == ["gpt-3.5-turbo", "gpt-4.1-mini"]
+    assert small["max_tokens"] == 200
+    assert large["models"] == ["gpt-4.1-mini", "gpt-3.5-turbo"]
+    assert large["max_tokens"] == 250
+
+
+def test_policy_override_is_merged_with_defaults(monkeypatch):
+    monkeypatch.setenv('MODEL_ROUTER_POLICY', json.dumps({
+        "min_samples": 3,
+        "endpoints": {"summary": {"max_tokens": 300}, "chat": {"models": ["gpt-4.1-mini"]}},
+        "large_payload": {"min_chars": 100}
+    }))
+
+    policy = load_policy()
+
+    assert policy["min_samples"] == 3
+    assert policy["max_error_rate"] == 0.2
+    assert policy["endpoints"]["summary"] == {
+        "models": ["gpt-3.5-turbo", "gpt-4.1-mini"],
+        "max_tokens": 300,
+        "latency_slo_ms": 4000
+    }
+    assert policy["endpoints"]["chat"] == {"models": ["gpt-4.1-mini"]}
+    assert policy["endpoints"]["analysis"]["max_tokens"] == 250
+    assert policy["large_payload"] == {"min_chars": 100, "models": ["gpt-4.1-mini"], "extra_max_tokens": 50}
+
+
+def test_invalid_policy_override_falls_back_to_defaults(monkeypatch):
+    monkeypatch.setenv('MODEL_ROUTER_POLICY', '{not json')
+    assert load_policy() == model_router_module.DEFAULT_POLICY
+
+
+def test_falls_back_to_next_model_on_failure():
+    client = FakeClient(failing={"gpt-3.5-turbo"})
+    content, routing = ModelRouter().complete(client, "summary", messages=[])
+
+    assert content == "ok"
+    assert routing["model"] == "gpt-4.1-mini"
+    assert routing["fallback_used"] is True
+    assert [call["model"] for call in client.calls] == ["gpt-3.5-turbo", "gpt-4.1-mini"]
+
+
+def test_all_models_failing_raises():
+    client = FakeClient(failing={"gpt-3.5-turbo", "gpt-4.1-mini"})
+    with pytest.raises(TimeoutError):
+        ModelRouter().complete(client, "summary", messages=[])
+
+
+def test_client_supplied_tier_is_ignored(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(openai, 'OpenAI', lambda **kwargs: client)
+    validator_store.clear()
+
+    response = index.app.test_client().post(
+        '/api/generate-summary',
+        json={"steps": 1, "user_tier": "premium"},
+        headers={'X-User-Tier': 'premium'}
+    )
+
+    assert response.json['model_routing']['tier'] == 'free'
+    assert client.calls[0]['max_tokens'] == 200